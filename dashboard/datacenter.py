@@ -2,7 +2,7 @@ import logging
 import ray.new_dashboard.consts as dashboard_consts
 import ray.new_dashboard.memory_utils as memory_utils
 from ray.new_dashboard.actor_utils import actor_classname_from_task_spec
-from ray.new_dashboard.utils import Dict, Signal
+from ray.new_dashboard.utils import Dict, GroupedListDict, Signal
 
 logger = logging.getLogger(__name__)
 
@@ -30,10 +30,10 @@ class DataSource:
     node_id_to_hostname = Dict()
     # {node ip (str): log entries by pid
     # (dict from pid to list of latest log entries)}
-    ip_and_pid_to_logs = Dict()
+    ip_and_pid_to_logs = GroupedListDict()
     # {node ip (str): error entries by pid
     # (dict from pid to list of latest err entries)}
-    ip_and_pid_to_errors = Dict()
+    ip_and_pid_to_errors = GroupedListDict()
 
 
 class DataOrganizer:
@@ -1,5 +1,8 @@
 NODE_STATS_UPDATE_INTERVAL_SECONDS = 1
 RETRY_GET_ALL_ACTOR_INFO_INTERVAL_SECONDS = 1
+ACTOR_SNAPSHOT_BATCH_SIZE = 512
 ACTOR_CHANNEL = "ACTOR"
 ERROR_INFO_UPDATE_INTERVAL_SECONDS = 5
 LOG_INFO_UPDATE_INTERVAL_SECONDS = 5
+PUBSUB_BATCH_SIZE = 64
+CHANNEL_EVICTION_INTERVAL_UPDATES = 100
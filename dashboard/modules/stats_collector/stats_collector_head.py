@@ -5,6 +5,7 @@ import json
 import aiohttp.web
 from aioredis.pubsub import Receiver
 from grpc.experimental import aio as aiogrpc
+from google.protobuf.internal import api_implementation
 
 import ray.gcs_utils
 import ray.new_dashboard.modules.stats_collector.stats_collector_consts \
@@ -17,51 +18,120 @@ from ray.core.generated import node_manager_pb2_grpc
 from ray.core.generated import gcs_service_pb2
 from ray.core.generated import gcs_service_pb2_grpc
 from ray.new_dashboard.datacenter import DataSource, DataOrganizer
-from ray.utils import binary_to_hex
 
 logger = logging.getLogger(__name__)
 routes = dashboard_utils.ClassMethodRouteTable
 
+_ANSI_RE = re.compile(r"\x1b\[\d+m")
+_PID_IP_RE = re.compile(r"\(pid=(\d+), ip=(.*?)\)")
+# The requests are never mutated, so build them once instead of per node
+# per tick.
+_GET_NODE_STATS_REQUESTS = {
+    include_memory_info: node_manager_pb2.GetNodeStatsRequest(
+        include_memory_info=include_memory_info)
+    for include_memory_info in (True, False)
+}
 
-def node_stats_to_dict(message):
-    return dashboard_utils.message_to_dict(
-        message, {
-            "actorId", "jobId", "taskId", "parentTaskId", "sourceActorId",
-            "callerId", "rayletId", "workerId"
-        })
+_NODE_STATS_HEX_KEYS = frozenset({
+    "actorId", "jobId", "taskId", "parentTaskId", "sourceActorId", "callerId",
+    "rayletId", "workerId"
+})
+_ACTOR_TABLE_DATA_HEX_KEYS = frozenset({
+    "actorId", "parentId", "jobId", "workerId", "rayletId",
+    "actorCreationDummyObjectId"
+})
 
 
-def actor_table_data_to_dict(message):
-    return dashboard_utils.message_to_dict(
-        message, {
-            "actorId", "parentId", "jobId", "workerId", "rayletId",
-            "actorCreationDummyObjectId"
-        },
-        including_default_value_fields=True)
+def _scan_error(message):
+    """Strip the ANSI escape sequences from an error message and find its
+    first (pid=..., ip=...).
+
+    Returns:
+        The stripped message, the pid and the ip (None if not found).
+    """
+    # The escapes are stripped before searching, because they may appear
+    # inside the (pid=..., ip=...) prefix.
+    message = _ANSI_RE.sub("", message)
+    match = _PID_IP_RE.search(message)
+    if match:
+        return message, match.group(1), match.group(2)
+    return message, None, None
+
+
+# The converters are generated from the message descriptors once, they are
+# equivalent to dashboard_utils.message_to_dict but much faster.
+node_stats_to_dict = dashboard_utils.build_message_to_dict(
+    node_manager_pb2.GetNodeStatsReply.DESCRIPTOR, _NODE_STATS_HEX_KEYS)
+
+actor_table_data_to_dict = dashboard_utils.build_message_to_dict(
+    ray.gcs_utils.ActorTableData.DESCRIPTOR,
+    _ACTOR_TABLE_DATA_HEX_KEYS,
+    including_default_value_fields=True)
 
 
 class StatsCollector(dashboard_utils.DashboardHeadModule):
     def __init__(self, dashboard_head):
         super().__init__(dashboard_head)
         self._stubs = {}
+        # {node id hex(str): raylet address(str)}
+        self._stub_addresses = {}
+        # {raylet address(str): grpc channel}, reused by the restarted nodes.
+        self._channels = {}
+        self._stub_updates = 0
         # JobInfoGcsServiceStub
         self._gcs_job_info_stub = None
         # ActorInfoGcsService
         self._gcs_actor_info_stub = None
         self._collect_memory_info = False
+        # The actor messages received before the actor snapshot from GCS is
+        # applied, None after that.
+        self._pending_actor_messages = []
         DataSource.nodes.signal.append(self._update_stubs)
+        # The pubsub handlers parse one protobuf message per event, which
+        # is several times slower with the pure-Python protobuf runtime.
+        if api_implementation.Type() == "python":
+            logger.warning(
+                "The pure-Python protobuf implementation is in use, actor "
+                "and error updates will be slow. Install protobuf with its "
+                "native extension for better performance.")
 
     async def _update_stubs(self, change):
         if change.old:
             node_id, node_info = change.old
+            # Keep the channel, the node may come back with the same address.
             self._stubs.pop(node_id)
+            self._stub_addresses.pop(node_id)
         if change.new:
             node_id, node_info = change.new
-            address = "{}:{}".format(node_info["nodeManagerAddress"],
-                                     int(node_info["nodeManagerPort"]))
-            channel = aiogrpc.insecure_channel(address)
+            address = f"{node_info['nodeManagerAddress']}:" \
+                      f"{node_info['nodeManagerPort']}"
+            channel = self._channels.get(address)
+            if channel is None:
+                # The raylets are in the cluster network, skip the proxy
+                # lookup.
+                channel = aiogrpc.insecure_channel(
+                    address, options=(("grpc.enable_http_proxy", 0), ))
+                self._channels[address] = channel
             stub = node_manager_pb2_grpc.NodeManagerServiceStub(channel)
             self._stubs[node_id] = stub
+            self._stub_addresses[node_id] = address
+
+        self._stub_updates += 1
+        if self._stub_updates % \
+                stats_collector_consts.CHANNEL_EVICTION_INTERVAL_UPDATES == 0:
+            await self._evict_channels()
+
+    async def _evict_channels(self):
+        # Pop all the unused channels before awaiting, so a stub created
+        # meanwhile never gets a closing channel.
+        in_use = set(self._stub_addresses.values())
+        unused = {
+            address: self._channels.pop(address)
+            for address in self._channels.keys() - in_use
+        }
+        for address, channel in unused.items():
+            logger.info("Close the unused channel to %s.", address)
+            await channel.close()
 
     @routes.get("/nodes")
     async def get_all_nodes(self, req) -> aiohttp.web.Response:
@@ -148,17 +218,7 @@ class StatsCollector(dashboard_utils.DashboardHeadModule):
         return await dashboard_utils.rest_response(
             success=True, message="Fetched errors.", errors=filtered_errs)
 
-    async def _update_actors(self):
-        # Subscribe actor channel.
-        aioredis_client = self._dashboard_head.aioredis_client
-        receiver = Receiver()
-
-        key = "{}:*".format(stats_collector_consts.ACTOR_CHANNEL)
-        pattern = receiver.pattern(key)
-        await aioredis_client.psubscribe(pattern)
-        logger.info("Subscribed to %s", key)
-
-        # Get all actor info.
+    async def _update_all_actors(self):
         while True:
             try:
                 logger.info("Getting all actor info from GCS.")
@@ -167,12 +227,27 @@ class StatsCollector(dashboard_utils.DashboardHeadModule):
                     request, timeout=2)
                 if reply.status.code == 0:
                     result = {}
-                    for actor_info in reply.actor_table_data:
-                        result[binary_to_hex(actor_info.actor_id)] = \
+                    actor_table_data = reply.actor_table_data
+                    batch_size = \
+                        stats_collector_consts.ACTOR_SNAPSHOT_BATCH_SIZE
+                    for start in range(0, len(actor_table_data), batch_size):
+                        result.update({
+                            actor_info.actor_id.hex():
                             actor_table_data_to_dict(actor_info)
+                            for actor_info in actor_table_data[start:start +
+                                                               batch_size]
+                        })
+                        # Converting a large snapshot takes a while, yield to
+                        # the event loop between the batches.
+                        await asyncio.sleep(0)
                     DataSource.actors.reset(result)
                     logger.info("Received %d actor info from GCS.",
                                 len(result))
+                    # Apply the actor messages received meanwhile.
+                    pending = self._pending_actor_messages
+                    self._pending_actor_messages = None
+                    for msg in pending:
+                        self._handle_actor_message(msg)
                     break
                 else:
                     raise Exception(
@@ -182,91 +257,111 @@ class StatsCollector(dashboard_utils.DashboardHeadModule):
                 await asyncio.sleep(stats_collector_consts.
                                     RETRY_GET_ALL_ACTOR_INFO_INTERVAL_SECONDS)
 
-        # Receive actors from channel.
-        async for sender, msg in receiver.iter():
-            try:
-                _, data = msg
-                pubsub_message = ray.gcs_utils.PubSubMessage.FromString(data)
-                actor_info = ray.gcs_utils.ActorTableData.FromString(
-                    pubsub_message.data)
-                DataSource.actors[binary_to_hex(actor_info.actor_id)] = \
-                    actor_table_data_to_dict(actor_info)
-            except Exception:
-                logger.exception("Error receiving actor info.")
+    def _handle_actor_message(self, msg):
+        if self._pending_actor_messages is not None:
+            self._pending_actor_messages.append(msg)
+            return
+        try:
+            _, data = msg
+            pubsub_message = ray.gcs_utils.PubSubMessage.FromString(data)
+            actor_info = ray.gcs_utils.ActorTableData.FromString(
+                pubsub_message.data)
+            DataSource.actors[actor_info.actor_id.hex()] = \
+                actor_table_data_to_dict(actor_info)
+        except Exception:
+            logger.exception("Error receiving actor info.")
 
-    @async_loop_forever(
-        stats_collector_consts.NODE_STATS_UPDATE_INTERVAL_SECONDS)
-    async def _update_node_stats(self):
-        for node_id, stub in self._stubs.items():
-            node_info = DataSource.nodes.get(node_id)
-            if node_info["state"] != "ALIVE":
-                continue
-            try:
-                reply = await stub.GetNodeStats(
-                    node_manager_pb2.GetNodeStatsRequest(
-                        include_memory_info=self._collect_memory_info),
-                    timeout=2)
-                reply_dict = node_stats_to_dict(reply)
-                DataSource.node_stats[node_id] = reply_dict
-            except Exception:
-                logger.exception(f"Error updating node stats of {node_id}.")
+    @staticmethod
+    def _handle_log_message(msg):
+        try:
+            # json.loads accepts the UTF-8 encoded payload directly.
+            data = json.loads(msg)
+            ip = data["ip"]
+            pid = str(data["pid"])
+            DataSource.ip_and_pid_to_logs.extend(ip, pid, data["lines"])
+            logger.info(f"Received a log for {ip} and {pid}")
+        except Exception:
+            logger.exception("Error receiving log info.")
 
-    async def _update_log_info(self):
+    @staticmethod
+    def _handle_error_message(msg):
+        try:
+            _, data = msg
+            pubsub_msg = ray.gcs_utils.PubSubMessage.FromString(data)
+            error_data = ray.gcs_utils.ErrorTableData.FromString(
+                pubsub_msg.data)
+            message, pid, ip = _scan_error(error_data.error_message)
+            if pid is not None:
+                DataSource.ip_and_pid_to_errors.append(
+                    ip, pid, {
+                        "message": message,
+                        "timestamp": error_data.timestamp,
+                        "type": error_data.type
+                    })
+                logger.info(f"Received error entry for {ip} {pid}")
+        except Exception:
+            logger.exception("Error receiving error info.")
+
+    async def _update_pubsub(self):
+        # Subscribe all the channels with one receiver.
         aioredis_client = self._dashboard_head.aioredis_client
         receiver = Receiver()
 
-        channel = receiver.channel(ray.gcs_utils.LOG_FILE_CHANNEL)
-        await aioredis_client.subscribe(channel)
-        logger.info("Subscribed to %s", channel)
+        actor_key = "{}:*".format(stats_collector_consts.ACTOR_CHANNEL)
+        actor_pattern = receiver.pattern(actor_key)
+        error_key = ray.gcs_utils.RAY_ERROR_PUBSUB_PATTERN
+        error_pattern = receiver.pattern(error_key)
+        await aioredis_client.psubscribe(actor_pattern, error_pattern)
+        logger.info("Subscribed to %s and %s", actor_key, error_key)
 
-        async for sender, msg in receiver.iter():
-            try:
-                data = json.loads(ray.utils.decode(msg))
-                logger.error(f"data={data}")
-                ip = data["ip"]
-                pid = str(data["pid"])
-                logs_for_ip = DataSource.ip_and_pid_to_logs.get(ip, {})
-                logs_for_pid = logs_for_ip.get(pid, [])
-                logs_for_pid.extend(data["lines"])
-                logs_for_ip[pid] = logs_for_pid
-                DataSource.ip_and_pid_to_logs[ip] = logs_for_ip
-                logger.info(f"Received a log for {ip} and {pid}")
-            except Exception:
-                logger.exception("Error receiving log info.")
+        log_channel = receiver.channel(ray.gcs_utils.LOG_FILE_CHANNEL)
+        await aioredis_client.subscribe(log_channel)
+        logger.info("Subscribed to %s", log_channel)
 
-    async def _update_error_info(self):
-        aioredis_client = self._dashboard_head.aioredis_client
-        receiver = Receiver()
+        # Get all actor info after subscribing the actor channel, so that
+        # no actor update is lost. The actor messages are buffered until the
+        # snapshot is applied, the logs and errors are handled meanwhile.
+        update_all_actors = asyncio.ensure_future(self._update_all_actors())
 
-        key = ray.gcs_utils.RAY_ERROR_PUBSUB_PATTERN
-        pattern = receiver.pattern(key)
-        await aioredis_client.psubscribe(pattern)
-        logger.info("Subscribed to %s", key)
+        handlers = {
+            actor_pattern: self._handle_actor_message,
+            error_pattern: self._handle_error_message,
+            log_channel: self._handle_log_message,
+        }
+        handled = 0
+        try:
+            async for sender, msg in receiver.iter():
+                handlers[sender](msg)
+                handled += 1
+                # The receiver returns queued messages without suspending,
+                # so yield to the event loop once per batch while draining a
+                # burst.
+                if handled % stats_collector_consts.PUBSUB_BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+        finally:
+            update_all_actors.cancel()
 
-        async for sender, msg in receiver.iter():
+    @async_loop_forever(
+        stats_collector_consts.NODE_STATS_UPDATE_INTERVAL_SECONDS)
+    async def _update_node_stats(self):
+        async def _fetch(node_id, stub):
             try:
-                _, data = msg
-                pubsub_msg = ray.gcs_utils.PubSubMessage.FromString(data)
-                error_data = ray.gcs_utils.ErrorTableData.FromString(
-                    pubsub_msg.data)
-                message = error_data.error_message
-                message = re.sub(r"\x1b\[\d+m", "", message)
-                match = re.search(r"\(pid=(\d+), ip=(.*?)\)", message)
-                if match:
-                    pid = match.group(1)
-                    ip = match.group(2)
-                    errs_for_ip = DataSource.ip_and_pid_to_errors.get(ip, {})
-                    pid_errors = errs_for_ip.get(pid, [])
-                    pid_errors.append({
-                        "message": message,
-                        "timestamp": error_data.timestamp,
-                        "type": error_data.type
-                    })
-                    errs_for_ip[pid] = pid_errors
-                    DataSource.ip_and_pid_to_errors[ip] = errs_for_ip
-                    logger.info(f"Received error entry for {ip} {pid}")
+                reply = await stub.GetNodeStats(
+                    _GET_NODE_STATS_REQUESTS[self._collect_memory_info],
+                    timeout=2)
+                return node_id, node_stats_to_dict(reply)
             except Exception:
-                logger.exception("Error receiving error info.")
+                logger.exception(f"Error updating node stats of {node_id}.")
+                return node_id, None
+
+        # Fetch the stats of all the alive nodes concurrently.
+        tasks = [
+            _fetch(node_id, stub) for node_id, stub in self._stubs.items()
+            if DataSource.nodes.get(node_id, {}).get("state") == "ALIVE"
+        ]
+        for node_id, reply_dict in await asyncio.gather(*tasks):
+            if reply_dict is not None:
+                DataSource.node_stats[node_id] = reply_dict
 
     async def run(self, server):
         gcs_channel = self._dashboard_head.aiogrpc_gcs_channel
@@ -275,6 +370,13 @@ class StatsCollector(dashboard_utils.DashboardHeadModule):
         self._gcs_actor_info_stub = \
             gcs_service_pb2_grpc.ActorInfoGcsServiceStub(gcs_channel)
 
-        await asyncio.gather(self._update_node_stats(), self._update_actors(),
-                             self._update_log_info(),
-                             self._update_error_info())
+        tasks = [
+            asyncio.ensure_future(self._update_node_stats()),
+            asyncio.ensure_future(self._update_pubsub())
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Tear down the remaining updaters if any of them fails.
+            for task in tasks:
+                task.cancel()
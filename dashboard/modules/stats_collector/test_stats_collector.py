@@ -200,5 +200,24 @@ def test_multi_nodes_info(enable_test_module, ray_start_cluster_head):
     wait_for_condition(_check_nodes, timeout=10)
 
 
+def test_scan_error():
+    from ray.new_dashboard.modules.stats_collector.stats_collector_head \
+        import _scan_error
+
+    message = "\x1b[2m\x1b[36m(pid=123, ip=10.0.0.1)\x1b[0m Error \x1b[31mx"
+    assert _scan_error(message) == ("(pid=123, ip=10.0.0.1) Error x", "123",
+                                    "10.0.0.1")
+    # Only the first (pid=..., ip=...) is returned.
+    message = "(pid=1, ip=a) (pid=2, ip=b)"
+    assert _scan_error(message) == (message, "1", "a")
+    assert _scan_error("\x1b[1mno pid") == ("no pid", None, None)
+    # The escapes inside the (pid=..., ip=...) prefix are stripped first.
+    assert _scan_error("(pid=1\x1b[0m2, ip=x)") == ("(pid=12, ip=x)", "12",
+                                                    "x")
+    assert _scan_error("(\x1b[1mpid=5, ip=x)") == ("(pid=5, ip=x)", "5", "x")
+    assert _scan_error("(pid=5, ip=1.2\x1b[0m.3.4)") == ("(pid=5, ip=1.2.3.4)",
+                                                         "5", "1.2.3.4")
+
+
 if __name__ == "__main__":
     sys.exit(pytest.main(["-v", __file__]))
@@ -337,6 +337,91 @@ def test_async_loop_forever():
     assert counter[0] > 2
 
 
+def test_grouped_list_dict():
+    d = dashboard_utils.GroupedListDict()
+    changes = []
+
+    async def _on_change(change):
+        changes.append(change)
+
+    d.signal.append(_on_change)
+    d.signal.freeze()
+    loop = asyncio.get_event_loop()
+
+    def _check_one_change(key, value):
+        # Exactly one signal is sent per update.
+        co = loop.run_until_complete(dashboard_utils.NotifyQueue.get())
+        loop.run_until_complete(co)
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(
+                asyncio.wait_for(dashboard_utils.NotifyQueue.get(), 0.1))
+        assert len(changes) == 1
+        change = changes.pop()
+        assert change.owner is d
+        assert change.old is None
+        assert change.new == (key, value)
+
+    d.extend("1.2.3.4", "100", ["a", "b"])
+    _check_one_change("1.2.3.4", {"100": ["a", "b"]})
+    d.extend("1.2.3.4", "100", ["c"])
+    _check_one_change("1.2.3.4", {"100": ["a", "b", "c"]})
+    d.append("1.2.3.4", "200", {"message": "err"})
+    _check_one_change("1.2.3.4", {
+        "100": ["a", "b", "c"],
+        "200": [{
+            "message": "err"
+        }]
+    })
+    d.append("5.6.7.8", "100", "d")
+    _check_one_change("5.6.7.8", {"100": ["d"]})
+
+    assert d["1.2.3.4"] == {
+        "100": ["a", "b", "c"],
+        "200": [{
+            "message": "err"
+        }]
+    }
+    assert d["5.6.7.8"] == {"100": ["d"]}
+    assert d.get("9.9.9.9", {}) == {}
+
+    # The read values are copies, mutating them does not change the data.
+    logs = d["5.6.7.8"]
+    logs["100"].append("e")
+    logs["200"] = ["f"]
+    assert d["5.6.7.8"] == {"100": ["d"]}
+
+
+def test_build_message_to_dict():
+    decode_keys = {"actorId", "jobId", "workerId", "rayletId"}
+    actor_table_data_to_dict = dashboard_utils.build_message_to_dict(
+        ray.gcs_utils.ActorTableData.DESCRIPTOR,
+        decode_keys,
+        including_default_value_fields=True)
+
+    message = ray.gcs_utils.ActorTableData(
+        actor_id=b"\x01\x02\x03",
+        job_id=b"\x04",
+        state=ray.gcs_utils.ActorTableData.ALIVE,
+        max_restarts=3)
+    message.address.raylet_id = b"\xff"
+    message.address.worker_id = b"\x00\x01"
+    message.address.ip_address = "127.0.0.1"
+    message.address.port = 1234
+    result = actor_table_data_to_dict(message)
+    assert result == dashboard_utils.message_to_dict(
+        message, decode_keys, including_default_value_fields=True)
+    assert result["actorId"] == "010203"
+    assert result["state"] == "ALIVE"
+    assert result["maxRestarts"] == "3"
+    assert result["address"]["workerId"] == "0001"
+
+    # Unset message fields are omitted, the others use the default values.
+    result = actor_table_data_to_dict(ray.gcs_utils.ActorTableData())
+    assert "address" not in result
+    assert result["actorId"] == ""
+    assert result["state"] == "DEPENDENCIES_UNREADY"
+
+
 def test_dashboard_module_decorator(enable_test_module):
     head_cls_list = dashboard_utils.get_all_modules(
         dashboard_utils.DashboardHeadModule)
@@ -9,9 +9,10 @@ import functools
 import importlib
 import inspect
 import logging
+import math
 import pkgutil
 import traceback
-from base64 import b64decode
+from base64 import b64decode, b64encode
 from collections.abc import MutableMapping, Mapping
 from collections import namedtuple
 from typing import Any
@@ -23,6 +24,7 @@ from aiohttp.frozenlist import FrozenList
 from aiohttp.typedefs import PathLike
 from aiohttp.web import RouteDef
 import aiohttp.signals
+from google.protobuf.descriptor import FieldDescriptor
 from google.protobuf.json_format import MessageToDict
 from ray.utils import binary_to_hex
 
@@ -263,35 +265,212 @@ def to_google_style(d):
     return new_dict
 
 
-def message_to_dict(message, decode_keys=None, **kwargs):
-    """Convert protobuf message to Python dict."""
+def _decode_keys(d, decode_keys):
+    # Decode in place, only the values of decode_keys are replaced.
+    for k, v in d.items():
+        if type(v) is dict:
+            _decode_keys(v, decode_keys)
+        elif type(v) is list:
+            for i in v:
+                if type(i) is dict:
+                    _decode_keys(i, decode_keys)
+        elif k in decode_keys:
+            d[k] = b64decode(v).hex()
+    return d
 
-    def _decode_keys(d):
-        for k, v in d.items():
-            if isinstance(v, dict):
-                d[k] = _decode_keys(v)
-            if isinstance(v, list):
-                new_list = []
-                for i in v:
-                    if isinstance(i, dict):
-                        new_list.append(_decode_keys(i))
-                    else:
-                        new_list.append(i)
-                d[k] = new_list
-            else:
-                if k in decode_keys:
-                    d[k] = binary_to_hex(b64decode(v))
-                else:
-                    d[k] = v
-        return d
 
+def message_to_dict(message, decode_keys=None, **kwargs):
+    """Convert protobuf message to Python dict."""
     if decode_keys:
         return _decode_keys(
-            MessageToDict(message, use_integers_for_enums=False, **kwargs))
+            MessageToDict(message, use_integers_for_enums=False, **kwargs),
+            decode_keys)
     else:
         return MessageToDict(message, use_integers_for_enums=False, **kwargs)
 
 
+class _MessageToDictCodegen:
+    """Generate the source of specialized protobuf message to dict converters.
+
+    One function is generated per message type (and per whether the hex
+    decoding applies), the fields are resolved here once instead of by
+    reflection on every call.
+    """
+
+    def __init__(self, decode_keys, including_default_value_fields):
+        self._decode_keys = frozenset(decode_keys or ())
+        self._including_defaults = including_default_value_fields
+        self._functions = {}
+        self._sources = []
+        self._namespace = {
+            "b64encode": b64encode,
+            "b64decode": b64decode,
+            "_decode_map": self._decode_map,
+            "_slow_path": self._slow_path,
+        }
+
+    def build(self, descriptor):
+        name = self._function(descriptor, bool(self._decode_keys))
+        exec("\n\n".join(self._sources), self._namespace)
+        return self._namespace[name]
+
+    def _decode_map(self, d):
+        # The map keys are checked against decode_keys like the field names.
+        for k, v in d.items():
+            if type(v) is not dict and k in self._decode_keys:
+                d[k] = b64decode(v).hex()
+        return d
+
+    def _slow_path(self, message, decode):
+        result = MessageToDict(
+            message,
+            use_integers_for_enums=False,
+            including_default_value_fields=self._including_defaults)
+        if decode and type(result) is dict:
+            _decode_keys(result, self._decode_keys)
+        return result
+
+    def _global(self, prefix, value):
+        name = f"_{prefix}{len(self._namespace)}"
+        self._namespace[name] = value
+        return name
+
+    @staticmethod
+    def _is_supported(descriptor):
+        if descriptor.file.package == "google.protobuf" or \
+                descriptor.file.syntax != "proto3":
+            return False
+        return all(field.cpp_type != FieldDescriptor.CPPTYPE_FLOAT
+                   for field in descriptor.fields)
+
+    def _function(self, descriptor, decode):
+        key = (descriptor.full_name, decode)
+        if key in self._functions:
+            return self._functions[key]
+        name = "_{}_to_dict{}".format(
+            descriptor.full_name.replace(".", "_"), "_decoded"
+            if decode else "")
+        self._functions[key] = name
+
+        lines = [f"def {name}(m):"]
+        if not self._is_supported(descriptor):
+            lines.append(f"    return _slow_path(m, {decode})")
+        else:
+            lines.append("    d = {}")
+            for field in descriptor.fields:
+                lines.extend(
+                    "    " + line for line in self._field(field, decode))
+            lines.append("    return d")
+        self._sources.append("\n".join(lines))
+        return name
+
+    def _field(self, field, decode):
+        key = repr(field.json_name)
+        attr = f"m.{field.name}"
+        if _is_map_entry(field):
+            key_field = field.message_type.fields_by_name["key"]
+            value_field = field.message_type.fields_by_name["value"]
+            if key_field.type == FieldDescriptor.TYPE_BOOL:
+                key_expr = '("true" if k else "false")'
+            elif key_field.type == FieldDescriptor.TYPE_STRING:
+                key_expr = "k"
+            else:
+                key_expr = "str(k)"
+            value_expr = self._value(value_field, "v", decode)
+            expr = f"{{{key_expr}: {value_expr} for k, v in {attr}.items()}}"
+            if decode and \
+                    value_field.cpp_type != FieldDescriptor.CPPTYPE_MESSAGE:
+                expr = f"_decode_map({expr})"
+            if self._including_defaults:
+                return [f"d[{key}] = {expr}"]
+            return [f"if {attr}:", f"    d[{key}] = {expr}"]
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+            expr = f"[{self._value(field, 'x', decode)} for x in {attr}]"
+            if self._including_defaults:
+                return [f"d[{key}] = {expr}"]
+            return [f"if {attr}:", f"    d[{key}] = {expr}"]
+
+        expr = self._value(field, "v", decode)
+        if decode and field.json_name in self._decode_keys:
+            if field.type == FieldDescriptor.TYPE_BYTES:
+                expr = "v.hex()"
+            elif field.cpp_type != FieldDescriptor.CPPTYPE_MESSAGE:
+                expr = f"b64decode({expr}).hex()"
+        if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE or \
+                field.containing_oneof is not None:
+            condition = f"m.HasField({field.name!r})"
+        elif self._including_defaults:
+            condition = None
+        else:
+            condition = "v"
+        lines = [f"v = {attr}"]
+        if condition is None:
+            lines.append(f"d[{key}] = {expr}")
+        else:
+            lines.extend([f"if {condition}:", f"    d[{key}] = {expr}"])
+        return lines
+
+    def _value(self, field, var, decode):
+        cpp_type = field.cpp_type
+        if cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+            return f"{self._function(field.message_type, decode)}({var})"
+        if cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+            values_by_number = field.enum_type.values_by_number
+            count = len(values_by_number)
+            if values_by_number.keys() == set(range(count)):
+                # Dense enums, e.g. ActorState, are looked up by index.
+                names = self._global(
+                    "enum",
+                    tuple(values_by_number[i].name for i in range(count)))
+                return f"({names}[{var}] if 0 <= {var} < {count} else {var})"
+            names = self._global("enum", {
+                number: value.name
+                for number, value in values_by_number.items()
+            })
+            return f"{names}.get({var}, {var})"
+        if cpp_type in (FieldDescriptor.CPPTYPE_INT64,
+                        FieldDescriptor.CPPTYPE_UINT64):
+            return f"str({var})"
+        if cpp_type == FieldDescriptor.CPPTYPE_DOUBLE:
+            to_json = self._global("double", _double_to_json)
+            return f"{to_json}({var})"
+        if field.type == FieldDescriptor.TYPE_BYTES:
+            return f"b64encode({var}).decode()"
+        return var
+
+
+def _is_map_entry(field):
+    return (field.type == FieldDescriptor.TYPE_MESSAGE
+            and field.message_type.has_options
+            and field.message_type.GetOptions().map_entry)
+
+
+def _double_to_json(value):
+    if math.isinf(value):
+        return "-Infinity" if value < 0 else "Infinity"
+    if math.isnan(value):
+        return "NaN"
+    return value
+
+
+def build_message_to_dict(descriptor,
+                          decode_keys=None,
+                          including_default_value_fields=False):
+    """Build a converter of a protobuf message type to Python dict.
+
+    The converter returns the same dict as message_to_dict, but it is
+    generated from the descriptor once, so it is much faster for the hot
+    paths.
+
+    :param descriptor: The descriptor of the protobuf message type.
+    :param decode_keys: The keys whose base64 values are converted to hex.
+    :param including_default_value_fields: Same as MessageToDict.
+    :return: A function converting a message of the type to dict.
+    """
+    return _MessageToDictCodegen(
+        decode_keys, including_default_value_fields).build(descriptor)
+
+
 class SignalManager:
     _signals = FrozenList()
 
@@ -406,6 +585,30 @@ class Dict(MutableMapping):
         self.update(d)
 
 
+class GroupedListDict(Dict):
+    """A Dict of {key: {sub key: list}} which supports in place updates.
+
+    :note: The appending methods report the change of the first level key
+           without the old value. The reported value is the live internal
+           data rather than a copy, so the handlers, which run later from
+           NotifyQueue, may see items appended after the change.
+    """
+
+    def _notify(self, key):
+        if len(self.signal):
+            co = self.signal.send(
+                Change(owner=self, new=Dict.ChangeItem(key, self._data[key])))
+            NotifyQueue.put(co)
+
+    def append(self, key, sub_key, item):
+        self._data.setdefault(key, {}).setdefault(sub_key, []).append(item)
+        self._notify(key)
+
+    def extend(self, key, sub_key, items):
+        self._data.setdefault(key, {}).setdefault(sub_key, []).extend(items)
+        self._notify(key)
+
+
 async def get_aioredis_client(redis_address, redis_password,
                               retry_interval_seconds, retry_times):
     for x in range(retry_times):
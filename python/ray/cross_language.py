@@ -2,6 +2,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import functools
+
 from ray import Language
 from ray._raylet import JavaFunctionDescriptor
 
@@ -11,6 +13,15 @@ __all__ = [
 ]
 
 
+@functools.lru_cache(maxsize=1024)
+def _java_function_descriptor(class_name, function_name, signature):
+    """Get a cached Java function descriptor.
+
+    Function descriptors are immutable, so they can be shared.
+    """
+    return JavaFunctionDescriptor(class_name, function_name, signature)
+
+
 def format_args(worker, args, kwargs):
     """Format args for various languages.
 
@@ -45,7 +56,7 @@ def get_function_descriptor_for_actor_method(
         Function descriptor for cross language actor method call.
     """
     if language == Language.JAVA:
-        return JavaFunctionDescriptor(
+        return _java_function_descriptor(
             actor_creation_function_descriptor.class_name,
             method_name,
             # Currently not support call actor method with signature.
@@ -66,7 +77,7 @@ def java_function(class_name, function_name):
     return RemoteFunction(
         Language.JAVA,
         lambda *args, **kwargs: None,
-        JavaFunctionDescriptor(class_name, function_name, ""),
+        _java_function_descriptor(class_name, function_name, ""),
         None,  # num_cpus,
         None,  # num_gpus,
         None,  # memory,
@@ -91,7 +102,7 @@ def java_actor_class(class_name):
     from ray.actor import ActorClass
     return ActorClass._ray_from_function_descriptor(
         Language.JAVA,
-        JavaFunctionDescriptor(class_name, "<init>", ""),
+        _java_function_descriptor(class_name, "<init>", ""),
         max_restarts=0,
         max_task_retries=0,
         num_cpus=None,